@@ -15,12 +15,15 @@ class AA_KNN(BaseLDL):
 
     def fit(self, X, y, k=5):
         super().fit(X, y)
-        self._model = NearestNeighbors(n_neighbors=k).fit(self._X)
+        self._model = NearestNeighbors(n_neighbors=k, n_jobs=-1).fit(self._X)
         return self
 
     def predict(self, X):
         _, inds = self._model.kneighbors(X)
-        return np.average(self._y[inds], axis=1)
+        y_pred = np.zeros((inds.shape[0], self._n_outputs), dtype=self._y.dtype)
+        for j in range(inds.shape[1]):
+            y_pred += self._y[inds[:, j]]
+        return y_pred / inds.shape[1]
 
 
 class AA_BP(BaseGD, BaseDeepLDL):
@@ -63,9 +66,9 @@ class CPNN(BaseGD, BaseDeepLDL):
         self._v = v
 
     @staticmethod
-    @tf.function
-    def loss_function(y, y_pred):
-        return tf.math.reduce_mean(keras.losses.kl_divergence(y, y_pred))
+    @tf.function(jit_compile=True, reduce_retracing=True)
+    def loss_function(y, log_y_pred):
+        return tf.math.reduce_mean(tf.math.reduce_sum(y * (tf.math.log(y + 1e-12) - log_y_pred), axis=1))
 
     def _get_default_model(self):
         input_shape = (self._n_features + (1 if self._mode == 'none' else self._n_outputs),)
@@ -77,29 +80,31 @@ class CPNN(BaseGD, BaseDeepLDL):
         return RProp()
 
     def _before_train(self):
+        if self._mode == 'none':
+            self._labels = tf.reshape(tf.range(1, self._n_outputs + 1, dtype=tf.float32), (-1, 1))
+        else:
+            self._labels = tf.eye(self._n_outputs)
         if self._mode == 'augment':
-            n = self._X.shape[0]
             one_hot = tf.one_hot(tf.math.argmax(self._y, axis=1), self.n_outputs)
+            v = tf.reshape(1. / tf.range(1, self._v + 1, dtype=tf.float32), (1, -1, 1))
             self._X = tf.repeat(self._X, self._v, axis=0)
-            self._y = tf.repeat(self._y, self._v, axis=0)
-            one_hot = tf.repeat(one_hot, self._v, axis=0)
-            v = tf.reshape(tf.tile([1 / (i + 1) for i in range(self._v)], [n]), (-1, 1))
-            self._y += self._y * one_hot * v
+            self._y = tf.reshape(self._y[:, tf.newaxis] * (1 + one_hot[:, tf.newaxis] * v), (-1, self._n_outputs))
 
     def _make_inputs(self, X):
-        temp = tf.reshape(tf.tile([i + 1 for i in range(self._n_outputs)], [X.shape[0]]), (-1, 1))
-        if self._mode != 'none':
-            temp = tf.one_hot(tf.reshape(temp, (-1, )) - 1, depth=self._n_outputs)
-        return tf.concat([tf.cast(tf.repeat(X, self._n_outputs, axis=0), dtype=tf.float32),
-                          tf.cast(temp, dtype=tf.float32)],
+        return tf.concat([tf.repeat(tf.cast(X, dtype=tf.float32), self._n_outputs, axis=0),
+                          tf.tile(self._labels, [tf.shape(X)[0], 1])],
                           axis=1)
 
-    def _call(self, X):
+    def _call(self, X, log=False):
         inputs = self._make_inputs(X)
         outputs = self._model(inputs)
-        results = tf.reshape(outputs, (X.shape[0], self._n_outputs))
-        b = tf.reshape(-tf.math.log(tf.math.reduce_sum(tf.math.exp(results), axis=1)), (-1, 1))
-        return tf.math.exp(b + results)
+        results = tf.reshape(outputs, (-1, self._n_outputs))
+        log_y_pred = results - tf.math.reduce_logsumexp(results, axis=1, keepdims=True)
+        return log_y_pred if log else tf.math.exp(log_y_pred)
+
+    @tf.function
+    def _loss(self, X, y, start, end):
+        return self.loss_function(y, self._call(X, log=True))
 
 
 class BCPNN(CPNN):
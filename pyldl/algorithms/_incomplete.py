@@ -1,6 +1,7 @@
 import numpy as np
+from scipy.linalg import cho_factor, cho_solve
 
-from qpsolvers import solve_qp
+import tensorflow as tf
 
 from pyldl.algorithms.utils import svt, proj
 from pyldl.algorithms.base import BaseADMM, BaseIncomLDL
@@ -10,31 +11,78 @@ class IncomLDL(BaseADMM, BaseIncomLDL):
     """:class:`IncomLDL <pyldl.algorithms.IncomLDL>` is proposed in paper :cite:`2017:xu`.
     """
 
-    def _update_W(self):
-
-        G = -np.eye(self._n_outputs, dtype=np.float64)
-        h = np.zeros((self._n_outputs, 1), dtype=np.float64)
-        A = np.ones((1, self._n_outputs), dtype=np.float64)
-        b = np.array([1.], dtype=np.float64)
-
-        M = np.zeros_like(self._y)
-
-        for i in range(self._X.shape[0]):
-            P = np.diag((1 + self._rho) * self._mask[i] + self._rho * (1 - self._mask[i])).astype(np.float64)
-            ql = (self._V[i] - self._y[i] * self._mask[i] - self._rho * self._Z[i]) * self._mask[i]
-            qr = (self._V[i] - self._rho * self._Z[i]) * (1 - self._mask[i])
-            q = np.transpose(ql + qr).astype(np.float64)
-            M[i] = solve_qp(P, q, G, h, A, b, solver='quadprog')
+    def _solve_qp(self, q, max_iterations=50):
+        M = self._M
+        u = self._u_buf
+        x = self._x_buf
+        u.fill(0.)
+        for _ in range(max_iterations):
+            np.subtract(M, u, out=x)
+            x *= self._sigma
+            x -= q
+            x *= self._inv
+            x += self._inv * (1 - np.sum(x, axis=1, keepdims=True)) / self._inv_sum
+            M = proj(x + u)
+            u += x
+            u -= M
+        return M
+
+    @staticmethod
+    @tf.function
+    def _solve_qp_tf(d, q, M, max_iterations=50):
+        sigma = tf.reduce_mean(d)
+        inv = 1. / (d + sigma)
+        inv_sum = tf.reduce_sum(inv, axis=1, keepdims=True)
+        u = tf.zeros_like(M)
+        for _ in tf.range(max_iterations):
+            x = (sigma * (M - u) - q) * inv
+            x += inv * (1 - tf.reduce_sum(x, axis=1, keepdims=True)) / inv_sum
+            M = proj(x + u)
+            u += x - M
+        return M
 
-        self._W = np.linalg.pinv(np.transpose(self._X) @ self._X) @ np.transpose(self._X) @ M
+    def _update_W(self):
+        q = self._V - self._rho * self._Z - self._ym
+        if self._use_gpu:
+            self._M = self._solve_qp_tf(tf.constant(self._d), tf.constant(q), tf.constant(self._M)).numpy()
+        else:
+            self._M = self._solve_qp(q)
+        if self._XtX_chol is not None:
+            self._W = cho_solve(self._XtX_chol, self._Xt @ self._M)
+        else:
+            self._W = self._XtX_pinv @ self._Xt @ self._M
+        self._XW = self._X @ self._W
 
     def _update_Z(self):
-        A = self._X @ self._W + self._V / self._rho
+        A = self._XW + self._V / self._rho
         tau = self._alpha / self._rho
         self._Z = svt(A, tau)
 
-    def fit(self, X, y, mask, alpha=1e-3, **kwargs):
+    def _update_V(self):
+        self._V = self._V + self._rho * (self._XW - self._Z)
+
+    def _before_train(self):
+        self._y = self._y.astype(np.float64, copy=False)
+        self._Xt = np.transpose(self._X)
+        XtX = self._Xt @ self._X
+        try:
+            ridge = 1e-8 * np.trace(XtX) / self._n_features
+            self._XtX_chol = cho_factor(XtX + ridge * np.eye(self._n_features))
+        except np.linalg.LinAlgError:
+            self._XtX_chol = None
+            self._XtX_pinv = np.linalg.pinv(XtX)
+        self._ym = self._y * self._mask
+        self._d = self._rho + self._mask
+        self._sigma = np.mean(self._d)
+        self._inv = 1. / (self._d + self._sigma)
+        self._inv_sum = np.sum(self._inv, axis=1, keepdims=True)
+        self._M = np.full(self._y.shape, 1. / self._n_outputs)
+        self._u_buf = np.empty_like(self._y)
+        self._x_buf = np.empty_like(self._y)
+
+    def fit(self, X, y, mask, alpha=1e-3, use_gpu=False, **kwargs):
         self._alpha = alpha
+        self._use_gpu = use_gpu and len(tf.config.list_physical_devices('GPU')) > 0
         return super().fit(X, y, mask=mask, **kwargs)
 
 
@@ -43,26 +91,31 @@ class WInLDL(BaseADMM, BaseIncomLDL):
     """
 
     def _update_W(self):
-        self._W = np.linalg.solve(
-            np.transpose(self._X) @ self._X + 1e-5 * np.eye(self._n_features),
-            np.transpose(self._X) @ (self._Z - self._V / self._rho)
-        )
+        self._W = cho_solve(self._XtX_chol, self._Xt @ (self._Z - self._V / self._rho))
+        self._XW = self._X @ self._W
 
     def _update_Z(self):
         self._update_Q()
-        Y = (self._X @ self._W) * (1 - self._mask) + self._y
-        numerator = self._rho * self._X @ self._W + self._V + self._Q * self._Q * Y
-        denominator = self._Q * self._Q + self._rho
+        Y = self._XW * self._one_minus_mask + self._y
+        numerator = self._rho * self._XW + self._V + self._QQ * Y
+        denominator = self._QQ + self._rho
         self._Z = proj(numerator / denominator)
 
+    def _update_V(self):
+        self._V = self._V + self._rho * (self._XW - self._Z)
+
     def _update_Q(self):
         a = 1 + self._current_iteration / self._max_iterations
-        self._Q2 = np.power(a, np.tile(self._avg, (self._y.shape[0], 1))) * (1 - self._mask)
+        self._Q2 = np.power(a, self._avg) * self._one_minus_mask
         self._Q = self._Q1 + self._Q2
+        self._QQ = self._Q * self._Q
 
     def _before_train(self):
         self._avg = np.sum(self._y, axis=0) / np.count_nonzero(self._y, axis=0)
         self._Q1 = np.exp2(1 - self._y) * self._mask
+        self._one_minus_mask = 1 - self._mask
+        self._Xt = np.transpose(self._X)
+        self._XtX_chol = cho_factor(self._Xt @ self._X + 1e-5 * np.eye(self._n_features))
 
     def fit(self, X, y, mask, rho=2., **kwargs):
         return super().fit(X, y, mask=mask, rho=rho, **kwargs)
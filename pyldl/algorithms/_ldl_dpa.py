@@ -1,11 +1,24 @@
-import keras
-import tensorflow as tf
+import numpy as np
 
-from scipy.stats import rankdata
+import tensorflow as tf
 
 from pyldl.algorithms.base import BaseDeepLDL, BaseBFGS
 
 
+def _rankdata(y):
+    order = np.argsort(y, axis=1)
+    s = np.take_along_axis(y, order, axis=1)
+    idx = np.broadcast_to(np.arange(y.shape[1]), y.shape)
+    diff = np.diff(s, axis=1) != 0
+    start = np.concatenate([np.ones((y.shape[0], 1), dtype=bool), diff], axis=1)
+    end = np.concatenate([diff, np.ones((y.shape[0], 1), dtype=bool)], axis=1)
+    first = np.maximum.accumulate(np.where(start, idx, 0), axis=1)
+    last = np.minimum.accumulate(np.where(end, idx, y.shape[1])[:, ::-1], axis=1)[:, ::-1]
+    R = np.empty(y.shape, dtype=np.float32)
+    np.put_along_axis(R, order, (first + last) / 2 + 1, axis=1)
+    return R
+
+
 class LDL_DPA(BaseBFGS, BaseDeepLDL):
     """:class:`LDL-DPA <pyldl.algorithms.LDL_DPA>` is proposed in paper :cite:`2024:jia`.
 
@@ -27,14 +40,15 @@ class LDL_DPA(BaseBFGS, BaseDeepLDL):
     @tf.function
     def _loss(self, params_1d):
         theta = self._params2model(params_1d)[0]
-        y_pred = keras.activations.softmax(self._X @ theta)
-        kld = tf.math.reduce_sum(keras.losses.kl_divergence(self._y, y_pred))
+        log_y_pred = tf.nn.log_softmax(self._X @ theta, axis=1)
+        y_pred = tf.exp(log_y_pred)
+        kld = tf.reduce_sum(self._y * (tf.math.log(self._y + 1e-12) - log_y_pred))
         rnkdpa = self.rnkdpa(self._R, y_pred)
         disvar = self.disvar(self._y, y_pred)
         return kld + self._alpha * rnkdpa + self._beta * disvar + self._gamma * self._l2_reg(theta)
 
     def _before_train(self):
-        self._R = tf.cast(rankdata(self._y, axis=1), tf.float32)
+        self._R = tf.convert_to_tensor(_rankdata(self._y.numpy()))
 
     def fit(self, X, y, alpha=1e-2, beta=1e-2, gamma=0., **kwargs):
         self._alpha = alpha
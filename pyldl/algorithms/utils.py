@@ -5,7 +5,10 @@ import numpy as np
 import keras
 import tensorflow as tf
 
-from keras import backend as K
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 
 EPS = np.finfo(np.float64).eps
@@ -76,9 +79,13 @@ def svt(A: np.ndarray, tau: float) -> np.ndarray:
     :return: The solution to the optimization problem.
     :rtype: np.ndarray
     """
+    if tau >= np.linalg.norm(A, 'fro'):
+        return np.zeros_like(A)
     U, S, VT = np.linalg.svd(A, full_matrices=False)
     S_thresh = np.maximum(S - tau, 0.)
-    return U @ np.diag(S_thresh) @ VT
+    if U.shape[0] <= VT.shape[1]:
+        return (U * S_thresh) @ VT
+    return U @ (S_thresh[:, np.newaxis] * VT)
 
 
 def solvel21(A: np.ndarray, tau: float) -> np.ndarray:
@@ -111,14 +118,51 @@ def solvel21(A: np.ndarray, tau: float) -> np.ndarray:
     return np.where(norms > tau, ((norms - tau) / norms) * A, 0.)
 
 
-def proj(Y: np.ndarray) -> np.ndarray:
+if njit is not None:
+    @njit(parallel=True, cache=True, fastmath=True)
+    def _proj_numba(Y, out):
+        n, l = Y.shape
+        for i in prange(n):
+            X = np.empty(l)
+            for k in range(l):
+                x = Y[i, k]
+                j = k
+                while j > 0 and X[j - 1] < x:
+                    X[j] = X[j - 1]
+                    j -= 1
+                X[j] = x
+            cs = 0.
+            theta = 0.
+            for k in range(l):
+                cs += X[k]
+                t = (cs - 1) / (k + 1)
+                if X[k] > t:
+                    theta = t
+            for j in range(l):
+                out[i, j] = max(Y[i, j] - theta, 0.)
+else:
+    _proj_numba = None
+
+
+def proj(Y: Union[np.ndarray, tf.Tensor]) -> Union[np.ndarray, tf.Tensor]:
     """This approach is proposed in paper :cite:`2016:condat`.
 
     :param Y: Matrix :math:`\\boldsymbol{Y}`.
-    :type Y: np.ndarray
+    :type Y: Union[np.ndarray, tf.Tensor]
     :return: The projection onto the probability simplex.
-    :rtype: np.ndarray
+    :rtype: Union[np.ndarray, tf.Tensor]
     """
+    if isinstance(Y, tf.Tensor):
+        X = tf.sort(Y, axis=1, direction='DESCENDING')
+        Xtmp = (tf.cumsum(X, axis=1) - 1) / tf.range(1, Y.shape[1] + 1, dtype=Y.dtype)
+        rho = tf.reduce_sum(tf.cast(X > Xtmp, tf.int32), axis=1) - 1
+        theta = tf.gather(Xtmp, rho, batch_dims=1)
+        return tf.maximum(Y - theta[:, tf.newaxis], 0)
+    if _proj_numba is not None and Y.shape[1] <= 32:
+        Y = np.ascontiguousarray(Y, dtype=np.float64)
+        out = np.empty_like(Y)
+        _proj_numba(Y, out)
+        return out
     X = -np.sort(-Y, axis=1)
     Xtmp = (np.cumsum(X, axis=1) - 1) / np.arange(1, Y.shape[1] + 1)
     rho = np.sum(X > Xtmp, axis=1) - 1
@@ -146,7 +190,9 @@ def binaryzation(y: np.ndarray, method='threshold', param: any = None) -> np.nda
     :return: Logical label matrix (shape: :math:`[n,\\, l]`).
     :rtype: np.ndarray
     """
-    r = np.argsort(np.argsort(y))
+    order = np.argsort(y, axis=1)
+    r = np.empty_like(order)
+    np.put_along_axis(r, order, np.broadcast_to(np.arange(y.shape[1]), y.shape), axis=1)
 
     if method == 'threshold':
         if param is None:
@@ -154,9 +200,9 @@ def binaryzation(y: np.ndarray, method='threshold', param: any = None) -> np.nda
         elif not isinstance(param, float) or param < 0. or param >= 1.:
             raise ValueError("Invalid param, when method is 'threshold', "
                              "param should be a float in the range [0, 1).")
-        b = np.sort(y.T, axis=0)[::-1]
-        cs = np.cumsum(b, axis=0)
-        m = np.argmax(cs >= param, axis=0)
+        b = -np.sort(-y, axis=1)
+        cs = np.cumsum(b, axis=1)
+        m = np.argmax(cs >= param, axis=1)
         return np.where(r >= y.shape[1] - m.reshape(-1, 1) - 1, 1, 0)
 
     elif method == 'topk':
@@ -171,6 +217,17 @@ def binaryzation(y: np.ndarray, method='threshold', param: any = None) -> np.nda
         raise ValueError("Invalid method, which should be 'threshold' or 'topk'.")
 
 
+@tf.function(jit_compile=True, reduce_retracing=True)
+def _pairwise_euclidean_tf(X, Y, symmetric=False):
+    X2 = tf.reduce_sum(tf.square(X), axis=1, keepdims=True)
+    Y2 = tf.reduce_sum(tf.square(Y), axis=1, keepdims=True)
+    XY = tf.matmul(X, Y, transpose_b=True)
+    D2 = X2 + tf.transpose(Y2) - 2 * XY
+    if symmetric:
+        D2 = D2 * (1. - tf.eye(tf.shape(D2)[0], dtype=D2.dtype))
+    return tf.where(D2 > 0., tf.sqrt(tf.where(D2 > 0., D2, 1.)), 0.)
+
+
 def pairwise_euclidean(X: Union[np.ndarray, tf.Tensor],
                        Y: Optional[Union[np.ndarray, tf.Tensor]] = None) -> Union[np.ndarray, tf.Tensor]:
     """Pairwise Euclidean distance.
@@ -182,11 +239,17 @@ def pairwise_euclidean(X: Union[np.ndarray, tf.Tensor],
     :return: Pairwise Euclidean distance (shape: :math:`[m_X,\\, m_Y]`).
     :rtype: Union[np.ndarray, tf.Tensor]
     """
+    symmetric = Y is None
     Y = X if Y is None else Y
     if isinstance(X, np.ndarray):
-        return np.sqrt(np.sum((X[:, np.newaxis] - Y[np.newaxis]) ** 2, axis=2))
+        X2 = np.sum(X ** 2, axis=1, keepdims=True)
+        Y2 = np.sum(Y ** 2, axis=1, keepdims=True)
+        D2 = X2 + np.transpose(Y2) - 2 * X @ np.transpose(Y)
+        if symmetric:
+            np.fill_diagonal(D2, 0.)
+        return np.sqrt(np.maximum(D2, 0.))
     elif isinstance(X, tf.Tensor):
-        return tf.sqrt(tf.reduce_sum((X[:, tf.newaxis] - Y[tf.newaxis]) ** 2, axis=2))
+        return _pairwise_euclidean_tf(X, Y, symmetric)
     else:
         raise TypeError("Input must be either a tf.Tensor or a np.ndarray")
 
@@ -194,61 +257,56 @@ def pairwise_euclidean(X: Union[np.ndarray, tf.Tensor],
 class RProp(keras.optimizers.Optimizer):
 
     def __init__(self, init_alpha=1e-3, scale_up=1.2, scale_down=0.5, min_alpha=1e-6, max_alpha=50., **kwargs):
+        if int(keras.__version__.split('.')[0]) >= 3:
+            kwargs.setdefault('learning_rate', init_alpha)
         super(RProp, self).__init__(name='rprop', **kwargs)
-        self.init_alpha = K.variable(init_alpha, name='init_alpha')
-        self.scale_up = K.variable(scale_up, name='scale_up')
-        self.scale_down = K.variable(scale_down, name='scale_down')
-        self.min_alpha = K.variable(min_alpha, name='min_alpha')
-        self.max_alpha = K.variable(max_alpha, name='max_alpha')
+        self.init_alpha = init_alpha
+        self.scale_up = scale_up
+        self.scale_down = scale_down
+        self.min_alpha = min_alpha
+        self.max_alpha = max_alpha
+        self._rprop_slots = {}
+
+    def _get_slots(self, param):
+        # The entry keeps ``param`` alive, so its id cannot be reused by another variable.
+        if id(param) not in self._rprop_slots:
+            self._rprop_slots[id(param)] = (param, (
+                tf.Variable(tf.fill(param.shape, tf.cast(self.init_alpha, param.dtype)), trainable=False),
+                tf.Variable(tf.zeros(param.shape, dtype=param.dtype), trainable=False),
+                tf.Variable(tf.zeros(param.shape, dtype=param.dtype), trainable=False)
+            ))
+        return self._rprop_slots[id(param)][1]
+
+    @tf.function(jit_compile=True)
+    def _rprop_step(self, grad, alpha, old_grad, prev_weight_delta):
+        sign_change = grad * old_grad
+        pos = tf.cast(sign_change > 0, grad.dtype)
+        neg = tf.cast(sign_change < 0, grad.dtype)
+        new_alpha = tf.minimum(alpha * self.scale_up, self.max_alpha) * pos + \
+            tf.maximum(alpha * self.scale_down, self.min_alpha) * neg + alpha * (1 - pos - neg)
+        weight_delta = tf.where(sign_change < 0, -prev_weight_delta, -tf.sign(grad) * new_alpha)
+        grad = tf.where(sign_change < 0, tf.zeros_like(grad), grad)
+        return new_alpha, weight_delta, grad
 
     def apply_gradients(self, grads_and_vars):
-        grads, trainable_variables = zip(*grads_and_vars)
-        self.get_updates(trainable_variables, grads)
-
-    def get_updates(self, params, gradients):
-        grads = gradients
-        shapes = [K.int_shape(p) for p in params]
-        alphas = [K.variable(np.ones(shape) * self.init_alpha) for shape in shapes]
-        old_grads = [K.zeros(shape) for shape in shapes]
-        prev_weight_deltas = [K.zeros(shape) for shape in shapes]
-        self.updates = []
-
-        for param, grad, old_grad, prev_weight_delta, alpha in zip(params, grads,
-                                                                   old_grads, prev_weight_deltas,
-                                                                   alphas):
-
-            new_alpha = K.switch(
-                K.greater(grad * old_grad, 0),
-                K.minimum(alpha * self.scale_up, self.max_alpha),
-                K.switch(K.less(grad * old_grad, 0), K.maximum(alpha * self.scale_down, self.min_alpha), alpha)
-            )
-
-            new_delta = K.switch(K.greater(grad, 0),
-                                 -new_alpha,
-                                 K.switch(K.less(grad, 0),
-                                          new_alpha,
-                                          K.zeros_like(new_alpha)))
-
-            weight_delta = K.switch(K.less(grad*old_grad, 0), -prev_weight_delta, new_delta)
-
-            new_param = param + weight_delta
-
-            grad = K.switch(K.less(grad*old_grad, 0), K.zeros_like(grad), grad)
-
-            self.updates.append(K.update(param, new_param))
-            self.updates.append(K.update(alpha, new_alpha))
-            self.updates.append(K.update(old_grad, grad))
-            self.updates.append(K.update(prev_weight_delta, weight_delta))
-
-        return self.updates
+        for grad, param in grads_and_vars:
+            if grad is None:
+                continue
+            alpha, old_grad, prev_weight_delta = self._get_slots(param)
+            new_alpha, weight_delta, grad = self._rprop_step(grad, alpha, old_grad, prev_weight_delta)
+            param.assign_add(weight_delta)
+            alpha.assign(new_alpha)
+            old_grad.assign(grad)
+            prev_weight_delta.assign(weight_delta)
+        self.iterations.assign_add(1)
 
     def get_config(self):
         config = {
-            'init_alpha': float(K.get_value(self.init_alpha)),
-            'scale_up': float(K.get_value(self.scale_up)),
-            'scale_down': float(K.get_value(self.scale_down)),
-            'min_alpha': float(K.get_value(self.min_alpha)),
-            'max_alpha': float(K.get_value(self.max_alpha)),
+            'init_alpha': self.init_alpha,
+            'scale_up': self.scale_up,
+            'scale_down': self.scale_down,
+            'min_alpha': self.min_alpha,
+            'max_alpha': self.max_alpha,
         }
         base_config = super(RProp, self).get_config()
         return dict(list(base_config.items()) + list(config.items()))